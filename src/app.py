@@ -1,18 +1,23 @@
 
 import socketio
 from typing import Dict, Any
-from operator import itemgetter
 import traceback
 import sys
 import signal
+import threading
 from instruments.experiment import ExperimentHandler, backup_handler
 from utils.logger import logger
-from settings import config_handler, validator, error_logger, SERVER_URL, TIMEOUT, INTERVAL_MINUTES, PING_URL
+from utils import json_shim
+from config.validation_handler import ConfigValidationError
+from settings import config_handler, validator, error_logger, SERVER_URL, TIMEOUT, INTERVAL_MINUTES, PING_URL, SOCKET_SERIALIZER
 import time 
 import requests
+from requests.adapters import HTTPAdapter
 
 
 sio = socketio.Client(
+    serializer=SOCKET_SERIALIZER,
+    json=json_shim,  # orjson backed encoding and decoding of the packets
     reconnection=True,
     reconnection_attempts=float('inf'),  # Unlimited reconnection attempts
     reconnection_delay=1,     # Initial delay
@@ -20,46 +25,49 @@ sio = socketio.Client(
     randomization_factor=0.5   # Add some jitter to reconnection timing
 )
 
+# Keep-alive session reused by every ping, so the TCP/TLS connection is not renegotiated each time
+_PING_SESSION = requests.Session()
+_PING_SESSION.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+_PING_SESSION.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+
+# Set on shutdown so waiting background tasks return immediately
+_SHUTDOWN = threading.Event()
+
+REFRESH_DEBOUNCE_SECONDS = 0.1 # Config updates within this window produce a single refresh_device_data
+
 def ping_server():
     """
     Ping a server URL and log the response.
-    Retries every 5 seconds if the connection times out.
     
     Returns:
         bool: True if ping was successful, False otherwise
     """
     try:
-        response = requests.get(PING_URL, timeout=TIMEOUT)
+        response = _PING_SESSION.get(PING_URL, timeout=TIMEOUT)
         
         if response.status_code == 200:
-            logger.info(f"Successfully pinged {PING_URL} - Status: {response.status_code}")
+            logger.info("Successfully pinged %s - Status: %s", PING_URL, response.status_code)
             return True
         else:
-            logger.warning(f"Ping to {PING_URL} returned status code {response.status_code}")
+            logger.warning("Ping to %s returned status code %s", PING_URL, response.status_code)
             return False
     except requests.exceptions.Timeout:
-        logger.warning(f"Connection to {PING_URL} timed out. Retrying in 5 seconds...")
-        time.sleep(5)
-        
+        logger.warning("Connection to %s timed out.", PING_URL)
+        return False
     except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to ping {PING_URL}: {str(e)}")
+        logger.error("Failed to ping %s: %s", PING_URL, e)
         return False
 
 
-def keep_server_alive():
-     while True:
-        logger.info("Trying to ping the server to keep it alive")
-        ping_server()
-        # Sleep for the specified interval
-        time.sleep(INTERVAL_MINUTES * 60)
-
 def signal_handler( sig, frame):
     logger.info("\nShutting down gracefully...")
+    _SHUTDOWN.set()
     cleanup()
     
 def cleanup():
     if sio.connected:
         sio.disconnect()
+    _PING_SESSION.close()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, signal_handler)
@@ -67,28 +75,64 @@ signal.signal(signal.SIGTERM,signal_handler)
 
 
 class DeviceSocketClient:
+    # Config handler method names and the data keys passed as extra arguments, by context and operation
+    _PIPELINE_SPEC = {
+        "device": {
+            "update": ("update_device_info", None),
+        },
+        "configuration": {
+            "create": ("add_device_configuration", None),
+            "update": ("update_device_configuration_info", None),
+            "delete": ("delete_device_configuration", ("configurationID",)),
+        },
+        "location": {
+            "create": ("add_location", ("configurationID",)),
+            "update": ("update_location_info", ("configurationID", "locationID")),
+            "delete": ("delete_location", ("configurationID", "locationID")),
+        },
+        "sensor": {
+            "create": ("add_sensor", ("configurationID", "locationID")),
+            "update": ("update_sensor_info", ("configurationID", "locationID", "sensorID")),
+            "delete": ("delete_sensor", ("configurationID", "locationID", "sensorID")),
+        },
+    }
+    # Experiment handler method names for each experiment command
+    _COMMAND_SPEC = {
+        "startExperiment": "start_experiment",
+        "pauseExperiment": "pause_experiment",
+        "resumeExperiment": "resume_experiment",
+        "stopExperiment": "stop_experiment",
+    }
 
     def __init__(self,server_url: str = None):
         self.server_url = server_url 
-        self.connected = False
+        self._cached_config = None
+        self._cached_device_id = None
+        self._emit = sio.emit
+        self._refresh_pending = False
+        self._refresh_lock = threading.Lock()
+        self._last_traffic_monotonic = time.monotonic()
+        self._pipeline = {
+            context: {operation: (getattr(config_handler, name), args) for operation, (name, args) in operations.items()}
+            for context, operations in self._PIPELINE_SPEC.items()
+        }
         self.event_handlers_registrations()
         self.experiment_handler = ExperimentHandler(sio, connection_handler=self)
+        self._commands = {
+            cmd: getattr(self.experiment_handler, name) for cmd, name in self._COMMAND_SPEC.items()
+        }
 
     def parseCommands(self, command_data): 
-        if not isinstance(command_data, dict) or "data" not in command_data or "cmd" not in command_data: 
+        try:
+            cmd = command_data["cmd"]
+            data = command_data["data"]
+        except (TypeError, KeyError):
             raise ValueError("Command data has invalid format") 
-        
-        commands = {
-            "startExperiment": self.experiment_handler.start_experiment,
-            "pauseExperiment": self.experiment_handler.pause_experiment,
-            "resumeExperiment": self.experiment_handler.resume_experiment,
-            "stopExperiment": self.experiment_handler.stop_experiment
-        }
-        
-        if command_data["cmd"] not in commands:
-            raise ValueError(f"Unknown command: {command_data['cmd']}")
-        
-        commands[command_data["cmd"]](command_data["data"])
+
+        fn = self._commands.get(cmd)
+        if fn is None:
+            raise ValueError(f"Unknown command: {cmd}")
+        fn(data)
 
     def event_handlers_registrations(self):
         # Register event handlers
@@ -99,8 +143,21 @@ class DeviceSocketClient:
 
    
 
+    def register_traffic(self):
+        """Records that data was exchanged with the server, so the keep alive ping can be skipped."""
+        self._last_traffic_monotonic = time.monotonic()
+
+    def _idle_ping_loop(self):
+        """Pings the server to keep it alive, but only when the socket has been idle for a full interval."""
+        idle_period = INTERVAL_MINUTES * 60
+        while not _SHUTDOWN.wait(idle_period):
+            if time.monotonic() - self._last_traffic_monotonic > idle_period:
+                logger.info("Trying to ping the server to keep it alive")
+                ping_server()
+
     def _receive_command(self, command_data): 
-        logger.info(f"Command received: {command_data}")
+        self.register_traffic()
+        logger.info("Command received: %s", command_data)
         try: 
             self.parseCommands(command_data)
         except Exception as err: 
@@ -108,56 +165,42 @@ class DeviceSocketClient:
             
     def apply_cmd(self, cmd):
         """Applies the received command after validation"""
-        cmd_pipline={
-            "device|update": {"fn": config_handler.update_device_info, "args": None},
-            "configuration|create": {"fn": config_handler.add_device_configuration, "args": None},
-            "configuration|update": {"fn": config_handler.update_device_configuration_info, "args": None},
-            "configuration|delete": {"fn": config_handler.delete_device_configuration, "args": ["configurationID"]},
-            "location|create": {"fn": config_handler.add_location, "args": ["configurationID"]},
-            "location|update": {"fn": config_handler.update_location_info, "args": ["configurationID", "locationID"]},
-            "location|delete": {"fn": config_handler.delete_location, "args": ["configurationID", "locationID"]},
-            "sensor|create": {"fn": config_handler.add_sensor, "args": ["configurationID", "locationID"]},
-            "sensor|update": {"fn": config_handler.update_sensor_info, "args": ["configurationID", "locationID", "sensorID"]},
-            "sensor|delete": {"fn": config_handler.delete_sensor, "args": ["configurationID", "locationID", "sensorID"]},
-        }
-        context, operation, data = itemgetter("context", "operation", "data")(cmd)
-
-        pipe_cmd = f"{context}|{operation}"
-        pipeline_fn = cmd_pipline[pipe_cmd]["fn"]
-        pipeline_args = cmd_pipline[pipe_cmd]["args"]
-        if bool(pipeline_args): 
-            args = [data[arg] for arg in pipeline_args]
-            pipeline_fn(data, *args)
+        context, operation = cmd["context"], cmd["operation"]
+        try:
+            fn, arg_keys = self._pipeline[context][operation]
+        except KeyError:
+            raise ValueError(f"Unsupported config operation: {context} {operation}")
+        data = cmd["data"]
+        if arg_keys: 
+            fn(data, *(data[key] for key in arg_keys))
         else: 
-            pipeline_fn(data)
+            fn(data)
+        self._cached_config = None
+
+    def _get_config_cached(self) -> Dict[str, Any]:
+        """Returns the device configuration, reading it from the config handler only after a change."""
+        if self._cached_config is None:
+            self._cached_config = config_handler.get_config()
+            self._cached_device_id = self._cached_config["id"]
+        return self._cached_config
+
+    def _get_device_id(self):
+        self._get_config_cached()
+        return self._cached_device_id
 
     def _handle_connect(self) -> None:
         """Handle successful connection to server."""
-        self.connected = True
-        logger.info(f"Connected to server: {self.server_url}")
+        logger.info("Connected to server: %s", self.server_url)
         # Send initial device configuration
-        sio.emit("register_client", "rpi")
-        sio.emit("get_rpi_config", config_handler.get_config())
+        self._emit("register_client", "rpi")
+        self._emit("get_rpi_config", self._get_config_cached())
         if self.experiment_handler.is_experiment_ongoing():
             unsent_data = backup_handler.get_full_backup_data()
-            sio.emit("get_ongoing_experiment_data", unsent_data)
+            self._emit("get_ongoing_experiment_data", unsent_data)
 
     def _handle_disconnect(self) -> None:
         """Handle disconnection from server."""
-        self.connected = False
         logger.info("Disconnected from server")
-        # self.reconnect_to_server()
-
-    def reconnect_to_server(self):
-        logger.info("Trying to reconnect...")
- 
-        tries = 10
-        current_attempts = 0
-        while tries > current_attempts: 
-            self.connect()
-            current_attempts = current_attempts + 1
-            time.sleep(10)
-            
 
     def _handle_config_update(self, cmd: Dict[str, Any]) -> None:
         """
@@ -176,15 +219,33 @@ class DeviceSocketClient:
                 }
         """ 
         
+        self.register_traffic()
         try:
-            logger.info(f"Received config update: {cmd}")
+            logger.info("Received config update: %s", cmd)
             validator.validateConfigOperationCommand(cmd)
             self.apply_cmd(cmd)
-            sio.emit("refresh_device_data", config_handler.get_config())
+            self._schedule_refresh()
+        except ConfigValidationError as e:
+            logger.warning("Invalid config update: %s", e)
+            self.report_error(f"Error handling config update: {e}", include_traceback=False)
         except Exception as e:
             logger.error(traceback.format_exc())
             self.report_error(f"Error handling config update: {e}")
 
+    def _schedule_refresh(self) -> None:
+        """Schedules a single refresh_device_data emit for a burst of config updates."""
+        with self._refresh_lock:
+            if self._refresh_pending:
+                return
+            self._refresh_pending = True
+        sio.start_background_task(self._debounced_refresh)
+
+    def _debounced_refresh(self) -> None:
+        sio.sleep(REFRESH_DEBOUNCE_SECONDS)
+        with self._refresh_lock:
+            self._refresh_pending = False
+        self._emit("refresh_device_data", self._get_config_cached())
+
     def connect(self) -> None:
         """Connect to the Socket.IO server."""
         try:
@@ -195,39 +256,35 @@ class DeviceSocketClient:
     def disconnect(self) -> None:
         """Disconnect from the Socket.IO server."""
      
-        if self.connected:
+        if sio.connected:
             sio.disconnect()
 
 
     def start(self) -> None:
         """Start the Socket.IO client with automatic reconnection."""
+        sio.start_background_task(self._idle_ping_loop)
         while True:
             try:
-                if not self.connected:
-                    self.connect()
-                sio.sleep(1)
+                self.connect()
+                # Blocks until the connection ends; reconnections are handled by the client
+                sio.wait()
             except Exception as e:
                 self.report_error(f"Error in client: {e}")
-                if self.connected:
+                if sio.connected:
                     cleanup()
 
-    def report_error(self, err): 
-        logger.error(f"An error occured in a device command: {err}")
-        error_logger.log_error(err)
-        if self.connected:
-            sio.emit("error", {
+    def report_error(self, err, include_traceback=True): 
+        logger.error("An error occured in a device command: %s", err)
+        error_logger.log_error(err, include_traceback=include_traceback)
+        if sio.connected:
+            self._emit("error", {
                 "message": f"An error occured in a device command: {err}",
-                "device_id": config_handler.get_config()["id"]
+                "device_id": self._get_device_id()
             })
 
-import threading
-
 if __name__ == "__main__": 
     try:
         socket = DeviceSocketClient(server_url=SERVER_URL)
-        thread = threading.Thread(target=keep_server_alive)
-        
-        thread.start()
         socket.start()
 
     except KeyboardInterrupt:
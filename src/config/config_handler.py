@@ -3,40 +3,148 @@ from pathlib import Path
 from typing import Dict, Any
 from datetime import datetime
 import uuid
+import os
 import sys
-from pathlib import Path
+import mmap
+import threading
+import atexit
+import functools
+from array import array
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Add parent directory to Python path
-sys.path.append(str(Path(__file__).parent.parent))
+_src_dir = str(Path(__file__).parent.parent)
+if _src_dir not in sys.path:
+    sys.path.append(_src_dir)
 
 from utils.logger import logger
-from config.validation_handler import Validator
+from config.validation_handler import Validator, ConfigValidationError
 
-_forbidden_keys_info = ["id", "createdAt", "status", "configurations"]
+CONFIG_SAVE_DELAY = 0.2 # Changes made within this window (in seconds) are written to file in a single save
+
+_forbidden_keys_info = frozenset(["id", "createdAt", "status", "configurations"])
 
 # Device Configuration Validations
-_forbidden_keys_configuration_info = ["id", "createdAt", "locations"]
-_forbidden_keys_location_info = ["id", "createdAt", "sensors"]
-_forbidden_keys_sensor_info = ["id", "createdAt"]
+_forbidden_keys_configuration_info = frozenset(["id", "createdAt", "locations"])
+_forbidden_keys_location_info = frozenset(["id", "createdAt", "sensors"])
+_forbidden_keys_sensor_info = frozenset(["id", "createdAt"])
+
+# Fields of a new device configuration, except the ones stamped when it is created
+_DEVICE_CONFIG_TEMPLATE = {
+    "name": "pH Monitor Device",
+    "isConnected": False,
+    "status": "ready",
+}
+
+
+def _locked(method):
+    """Runs a config mutator holding the handler lock, so a save on the timer thread never sees a half applied change."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _dumps(config: Dict[str, Any]) -> bytes:
+    """Serializes the configuration, using orjson when it is installed.
+    numpy values (e.g. calibration reads) are serialized natively, and anything else orjson rejects goes through json."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(config, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            pass
+    return json.dumps(config, indent=2).encode()
+
+
+def _loads(data: bytes) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _load_mapped(path: str) -> Dict[str, Any]:
+    """Parses a configuration file straight from a read only memory map of it."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if orjson is None:
+            return json.loads(mm[:])
+        view = memoryview(mm)
+        try:
+            return orjson.loads(view)
+        finally:
+            view.release()
 
 
 class ConfigHandler(): 
     def __init__(self, config_path):
         self.config_path = Path(config_path)
+        # Plain string paths used for the file operations
+        self._cfg_str = os.fspath(self.config_path)
+        self._tmp_str = self._cfg_str + '.tmp'
         self._default_config = None
+        self._dirty = False
+        self._cached_json = None
+        self._last_payload = None
+        self._lock = threading.RLock()
+        self._save_timer = None
+        atexit.register(self.flush)
 
     def _save_config(self, config: Dict[str, Any]) -> None:
         """Save device configuration to file."""
+        with self._lock:
+            self._write_config(config)
+
+    def _write_config(self, config: Dict[str, Any]) -> bool:
+        """Writes the configuration to file. Returns False if it could not be saved."""
         try:
-            # Create backup before saving
-            # if self.config_path.exists():
-            #     backup_path = self.config_path.with_suffix('.json.bak')
-            #     self.config_path.rename(backup_path)
-            with open(self.config_path, 'w') as f:
+            if config is not getattr(self, "config", None):
                 self.config = config
-                json.dump(config, f, indent=2)
+                self._cached_json = None
+            payload = self.get_config_json()
+            if payload == self._last_payload:
+                return True
+            # Write to a temporary file and swap it in, so a crash never leaves a half written config
+            with open(self._tmp_str, 'wb', buffering=65536) as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self._tmp_str, self._cfg_str)
+            self._last_payload = payload
+            return True
         except Exception as e:
             logger.error(f"Error saving config: {e}")
+            return False
+
+    def flush(self) -> None:
+        """Writes the configuration to file if it changed since the last save."""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if self._dirty:
+                # Stays dirty when the save fails, so the change is written by the next save
+                self._dirty = not self._write_config(self.config)
+
+    def _mark_dirty(self) -> None:
+        """Flags the configuration as changed and schedules a save, so a burst of changes is written once."""
+        with self._lock:
+            self._dirty = True
+            self._cached_json = None
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(CONFIG_SAVE_DELAY, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def get_config_json(self) -> bytes:
+        """Get the serialized configuration, reusing the last serialization while it is unchanged."""
+        with self._lock:
+            if self._cached_json is None:
+                self._cached_json = _dumps(self.get_config())
+            return self._cached_json
 
     def get_config(self) -> Dict[str, Any]:
         """Get current configuration."""
@@ -45,12 +153,11 @@ class ConfigHandler():
     def _load_file(self) -> Dict[str, Any]:
         """Load device configuration from file."""
         try:
-            if self.config_path.exists():
-                with open(self.config_path, 'r') as f:
-                    return json.load(f)
-            else:
-                self._save_config(self._default_config)
-                return self._default_config
+            return _load_mapped(self._cfg_str)
+        except FileNotFoundError:
+            default_config = self._make_default_config()
+            self._save_config(default_config)
+            return default_config
         except Exception as e:
             logger.error(f"Error loading config: {e}")
             return {}
@@ -58,41 +165,71 @@ class ConfigHandler():
     def set_default_config(self, config): 
         self._default_config = config
 
+    def _make_default_config(self) -> Dict[str, Any]:
+        """Builds the configuration written when there is no config file yet."""
+        return self._default_config
+
 
 class DeviceConfigHandler(ConfigHandler):
-    def __init__(self, config_path: str ="src/config/config_files/device_config.json"):
+    def __init__(self, config_path: str ="src/config/config_files/device_config.json", validator: Validator = None):
         super().__init__(config_path)
-        self.set_default_config({
-            "id": uuid.uuid4(), 
-            "name": "pH Monitor Device",
+        self.config = self._load_file()
+        self.validator = validator or Validator()
+        self._build_index()
+
+    def _make_default_config(self) -> Dict[str, Any]:
+        # Only built when there is no config file, so a new id is not generated on every start
+        return {
+            **_DEVICE_CONFIG_TEMPLATE,
+            "id": str(uuid.uuid4()), 
             "createdAt": datetime.now().isoformat(),
-            "isConnected": False,
-            "status": "ready",
             "configurations": []
-        })
-        self.config_path = Path(config_path)
-        self.config = self._load_file()
-        self.validator = Validator()
+        }
+
+    def _build_index(self):
+        """Indexes configurations, locations and sensors by id. The indexed dicts are the ones stored in self.config."""
+        self._conf_idx = {}
+        self._loc_idx = {}
+        self._sen_idx = {}
+        for conf in self.config.get("configurations", []):
+            self._index_configuration(conf)
+
+    def _index_configuration(self, conf):
+        self._conf_idx[conf["id"]] = conf
+        for loc in conf.get("locations", []):
+            self._index_location(conf["id"], loc)
+
+    def _index_location(self, configurationID, loc):
+        self._loc_idx[(configurationID, loc["id"])] = loc
+        for sen in loc.get("sensors", []):
+            self._sen_idx[(configurationID, loc["id"], sen["id"])] = sen
+
+    def _unindex_configuration(self, conf):
+        self._conf_idx.pop(conf["id"], None)
+        for loc in conf.get("locations", []):
+            self._unindex_location(conf["id"], loc)
+
+    def _unindex_location(self, configurationID, loc):
+        self._loc_idx.pop((configurationID, loc["id"]), None)
+        for sen in loc.get("sensors", []):
+            self._sen_idx.pop((configurationID, loc["id"], sen["id"]), None)
        
     def get_configuration_by_id(self, configurationID): 
-        return [x for x in self.config["configurations"] if x["id"] == configurationID]
+        conf = self._conf_idx.get(configurationID)
+        return [conf] if conf is not None else []
 
     def parse_updated_info(self, info, forbidden_keys):
         """Parses data received to be applied into the config file."""
-        for key in forbidden_keys: 
-            if key in info: 
-                logger.info(f"The new config has the attribute which will be removed: {key}")
-                info.pop(key, None)
-        return info
+        return self.validator.validate_and_strip(info, None, forbidden_keys)
 
+    @_locked
     def update_device_info(self, info: Dict[str, Any] )-> bool:
         parsedInfo = self.parse_updated_info(info, _forbidden_keys_info)
-        self._save_config({
-            **self.config, 
-            **parsedInfo
-        })
+        self.config.update(parsedInfo)
+        self._mark_dirty()
         return True
     
+    @_locked
     def add_device_configuration(self, data: Dict[str, Any] )-> bool:
         """Adds a new device configuration, i.e., new locations and sensors"""
         if len(self.config["configurations"]) == 3:
@@ -101,59 +238,64 @@ class DeviceConfigHandler(ConfigHandler):
         if not self.validator._validate_device_configuration(data): 
             self.report_error("The configuration information submited does not contain the correct fields")
         self.config["configurations"].append(data)
-        self._save_config(self.config)
+        self._index_configuration(data)
+        self._mark_dirty()
         return True
  
+    @_locked
     def update_device_configuration_info(self, info: Dict[str, Any] )-> bool:
         """Updates the device name"""
-        for i, conf in enumerate(self.config["configurations"]): 
-            if conf["id"] == info["id"]:
-                parsedInfo = self.parse_updated_info(info, _forbidden_keys_configuration_info)
-                self.config["configurations"][i] = {
-                    **self.config["configurations"][i],
-                    **parsedInfo
-                }
-        self._save_config(self.config)
+        conf = self._conf_idx.get(info["id"])
+        if conf is None:
+            return True
+        parsedInfo = self.parse_updated_info(info, _forbidden_keys_configuration_info)
+        conf.update(parsedInfo)
+        self._mark_dirty()
         return True
     
+    @_locked
     def delete_device_configuration(self,_, configurationID): 
-        for i, c in enumerate(self.config["configurations"]): 
-            if c["id"] == configurationID: 
-                del self.config["configurations"][i]
-        self._save_config(self.config)
+        conf = self._conf_idx.get(configurationID)
+        if conf is None:
+            return True
+        self.config["configurations"].remove(conf)
+        self._unindex_configuration(conf)
+        self._mark_dirty()
         return True
     
+    @_locked
     def add_location(self, data, configurationID):
         if not self.validator._validate_location(data): 
             self.report_error("The location information submited does not contain the correct fields")
-        for i, conf in enumerate(self.config["configurations"]): 
-            if conf["id"] == configurationID:
-                self.config["configurations"][i]["locations"].append(data)
-        self._save_config(self.config)
+        conf = self._conf_idx.get(configurationID)
+        if conf is None:
+            return True
+        conf["locations"].append(data)
+        self._index_location(configurationID, data)
+        self._mark_dirty()
         return True
     
+    @_locked
     def update_location_info(self, data, configurationID, locationID):
         parsedInfo = self.parse_updated_info(data, _forbidden_keys_location_info)
-        for i, conf in enumerate(self.config["configurations"]): 
-            if conf["id"] == configurationID:
-                for j, loc in enumerate(conf["locations"]):
-                    if loc["id"] == locationID:
-                        self.config["configurations"][i]["locations"][j] = {
-                            **self.config["configurations"][i]["locations"][j],
-                            **parsedInfo
-                        }
-        self._save_config(self.config)
+        loc = self._loc_idx.get((configurationID, locationID))
+        if loc is None:
+            return True
+        loc.update(parsedInfo)
+        self._mark_dirty()
         return True
   
+    @_locked
     def delete_location(self, _ , device_configuration_id, locationID): 
-        for i, c in enumerate(self.config["configurations"]): 
-            if c["id"] == device_configuration_id: 
-                for j, loc in enumerate(c["locations"]): 
-                    if loc["id"] == locationID:
-                        del self.config["configurations"][i]["locations"][j]
-        self._save_config(self.config)
+        loc = self._loc_idx.get((device_configuration_id, locationID))
+        if loc is None:
+            return True
+        self._conf_idx[device_configuration_id]["locations"].remove(loc)
+        self._unindex_location(device_configuration_id, loc)
+        self._mark_dirty()
         return True
 
+    @_locked
     def add_sensor(self, data, configurationID, locationID):
         data = {
             **data, 
@@ -161,47 +303,38 @@ class DeviceConfigHandler(ConfigHandler):
         }
         if not self.validator._validate_sensor(data): 
             self.report_error("The sensor information submited does not contain the correct fields")
-        for i, conf in enumerate(self.config["configurations"]): 
-            if conf["id"] == configurationID:
-                for j, loc in enumerate(conf["locations"]):
-                    if loc["id"] == locationID:
-                        self.config["configurations"][i]["locations"][j]["sensors"].append(data)
-        self._save_config(self.config)
+        loc = self._loc_idx.get((configurationID, locationID))
+        if loc is None:
+            return True
+        loc["sensors"].append(data)
+        self._sen_idx[(configurationID, locationID, data["id"])] = data
+        self._mark_dirty()
         return True
     
+    @_locked
     def update_sensor_info(self, data, configurationID, locationID, sensorID):
-        if not self.validator._validate_sensor(data):
-            logger.error("The sensor information submited does not contain the correct fields")
+        parsedInfo = self.validator.validate_and_strip(data, self.validator._validate_sensor, _forbidden_keys_sensor_info)
+        if parsedInfo is None:
             self.report_error("The sensor information submited does not contain the correct fields")
-        
-        parsedInfo = self.parse_updated_info(data, _forbidden_keys_sensor_info)
-        for i, conf in enumerate(self.config["configurations"]): 
-            if conf["id"] == configurationID:
-                for j, loc in enumerate(conf["locations"]):
-                    if loc["id"] == locationID:
-                        for k, sen in enumerate(loc["sensors"]): 
-                            if sen["id"] == sensorID: 
-                                self.config["configurations"][i]["locations"][j]["sensors"][k] = {
-                                    **self.config["configurations"][i]["locations"][j]["sensors"][k] ,
-                                    **parsedInfo
-                                }
-        self._save_config(self.config)
+        sen = self._sen_idx.get((configurationID, locationID, sensorID))
+        if sen is None:
+            return True
+        sen.update(parsedInfo)
+        self._mark_dirty()
         return True
     
+    @_locked
     def delete_sensor(self, _, device_configuration_id, locationID, sensorID): 
-        for i, c in enumerate(self.config["configurations"]): 
-            if c["id"] == device_configuration_id: 
-                for j, loc in enumerate(c["locations"]): 
-                    if loc["id"] == locationID:
-                        for k, sen in enumerate(loc["sensors"]): 
-                            if sen["id"] == sensorID: 
-                                del self.config["configurations"][i]["locations"][j]["sensors"][k]
-        self._save_config(self.config)
+        sen = self._sen_idx.pop((device_configuration_id, locationID, sensorID), None)
+        if sen is None:
+            return True
+        self._loc_idx[(device_configuration_id, locationID)]["sensors"].remove(sen)
+        self._mark_dirty()
         return True
 
     def report_error(self, msg): 
         logger.error(msg)
-        raise ValueError(msg) 
+        raise ConfigValidationError(msg) 
 
 
 class DeviceInputMappingHandler(ConfigHandler): 
@@ -239,22 +372,37 @@ class DeviceInputMappingHandler(ConfigHandler):
             }
         }
         self.config = self._load_file()
+        self._build_pin_table()
+
+    def _build_pin_table(self):
+        """Copies the pin numbers of every input into parallel arrays, indexed by the input position.
+        The file keeps its per input layout, and the calibration values stay in the input dicts."""
+        self._input_idx = {input_number: i for i, input_number in enumerate(self.config)}
+        self._probe = array('i', (config["probe"] for config in self.config.values()))
+        self._acidic = array('i', (config["acidic"] for config in self.config.values()))
+        self._alkaline = array('i', (config["alkaline"] for config in self.config.values()))
+
+    def _get_input_idx(self, input_number):
+        idx = self._input_idx.get(input_number)
+        if idx is None: 
+            raise ValueError("There is no input number configurtion for the provided input")
+        return idx
 
     def get_probe_pin(self, input_number): 
-        return self.get_sensor_key(input_number,"probe")
+        return self._probe[self._get_input_idx(input_number)]
 
     def get_pump_pins(self, input_number): 
-        config=self.get_input_number(input_number)
-        return (config["acidic"], config["alkaline"])
+        idx = self._get_input_idx(input_number)
+        return (self._acidic[idx], self._alkaline[idx])
 
+    @_locked
     def set_calibration_value(self, input_number, value_channel, value):
         config = self.get_input_number(input_number)
         self.get_sensor_key(input_number, value_channel)
+        # Updated in place, so the sensors holding this input config see the new value
         config[value_channel] = value
-        self._save_config({
-            **self.config,
-            input_number: config
-        })
+        self._mark_dirty()
+        self.flush()
 
     def get_input_number(self, input_number):
         if not input_number in self.config: 
@@ -2,14 +2,17 @@ import os
 import datetime
 import traceback
 import sys
-import glob
+import threading
+import atexit
+import time
+import heapq
+from collections import deque
+import re
 from typing import Optional, List, Tuple
-from pathlib import Path
-import sys 
 
-sys.path.append(str(Path(__file__).parent.parent))
-
-from utils.logger import logger
+# Log file name patterns: "error_log_YYYYMMDD.log" and "error_log_YYYYMMDD_HHMMSS.log"
+_DAILY_RE = re.compile(r'error_log_(\d{8})\.log')
+_TS_RE = re.compile(r'error_log_(\d{8}_\d{6})\.log')
 
 class ErrorLogger:
     """
@@ -55,7 +58,21 @@ class ErrorLogger:
         self.max_log_age_days = max_log_age_days
         self.max_total_size_mb = max_total_size_mb
         
-    def log_error(self, error: Exception, additional_info: str = ""):
+        # Storage cleanup runs in the background, at most once per interval or when the log file rotates
+        self._cleanup_interval_s = 3600
+        self._last_cleanup_ts = float("-inf")
+        self._cleanup_thread = None
+        
+        # Append handle kept open between errors, reopened when the log file changes
+        self._log_fh = None
+        self._log_fh_lock = threading.Lock()
+        # Entries waiting to be written, as (log_file_path, encoded_entry)
+        self._pending = deque()
+        # (second, day string, timestamp string) of the last logged error
+        self._time_strings = (None, None, None)
+        atexit.register(self.close)
+        
+    def log_error(self, error: Exception, additional_info: str = "", include_traceback: bool = True):
         """
         Log an error to the file with timestamp, error type, message, and traceback.
         Also manages log storage.
@@ -63,102 +80,187 @@ class ErrorLogger:
         Args:
             error: The exception object to log
             additional_info: Any additional information to include in the log
+            include_traceback: Set to False for expected errors (e.g. invalid input), so no traceback is formatted
         """
-        logger.info("Saving the error into a log file...")
+        today, timestamp = self._get_time_strings()
         
         # If using daily rotation, update the log file name based on current date
+        rotated = False
         if self.use_daily_rotation:
-            today = datetime.datetime.now().strftime('%Y%m%d')
             current_log_name = f"error_log_{today}.log"
             if current_log_name != self.log_file_name:
                 self.log_file_name = current_log_name
                 self.log_file_path = os.path.join(self.log_directory, self.log_file_name)
+                rotated = True
         
-        # Manage storage to ensure we have space
-        self.manage_log_storage()
+        # Manage storage to ensure we have space, without blocking the error report.
+        # A rotation makes the previous log file eligible for cleanup, so it is handled right away
+        self._schedule_storage_cleanup(force=rotated)
         
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         error_type = type(error).__name__
         error_message = str(error)
         
-        # Get the full traceback
-        tb = traceback.format_exc()
+        # Get the full traceback, formatting it only when there is one
+        error_tb = getattr(error, "__traceback__", None)
+        if not include_traceback:
+            tb = "Not captured\n"
+        elif error_tb is not None:
+            tb = "".join(traceback.format_exception(type(error), error, error_tb))
+        elif sys.exc_info()[0] is not None:
+            tb = traceback.format_exc()
+        else:
+            tb = "No traceback available\n"
         
         # Format the log entry
-        log_entry = (
-            f"===== ERROR LOG: {timestamp} =====\n"
-            f"Type: {error_type}\n"
-            f"Message: {error_message}\n"
-        )
-        if additional_info:
-            log_entry += f"Additional Info: {additional_info}\n"
-            
-        log_entry += f"Traceback:\n{tb}\n\n"
+        log_entry = "".join((
+            f"===== ERROR LOG: {timestamp} =====\n",
+            f"Type: {error_type}\n",
+            f"Message: {error_message}\n",
+            f"Additional Info: {additional_info}\n" if additional_info else "",
+            f"Traceback:\n{tb}\n\n",
+        ))
         
         # Write to log file
-        with open(self.log_file_path, 'a') as log_file:
-            log_file.write(log_entry)
+        self._pending.append((self.log_file_path, log_entry.encode('utf-8')))
+        self._write_pending()
             
         return log_entry
     
+    def _get_time_strings(self) -> Tuple[str, str]:
+        """
+        Get the current day ('%Y%m%d') and timestamp ('%Y-%m-%d %H:%M:%S') strings,
+        formatting them only once per second.
+        """
+        now = int(time.time())
+        if now != self._time_strings[0]:
+            local_time = time.localtime(now)
+            self._time_strings = (now, time.strftime('%Y%m%d', local_time), time.strftime("%Y-%m-%d %H:%M:%S", local_time))
+        return self._time_strings[1], self._time_strings[2]
+    
+    def _write_pending(self):
+        """
+        Write every pending entry. The thread that gets the lock writes the entries queued
+        by the others as well, with one write and flush per log file; the others return right away.
+        """
+        while self._pending:
+            if not self._log_fh_lock.acquire(blocking=False):
+                return
+            try:
+                path, chunks = None, []
+                while self._pending:
+                    entry_path, entry = self._pending.popleft()
+                    if entry_path != path:
+                        self._write_chunks(path, chunks)
+                        path, chunks = entry_path, []
+                    chunks.append(entry)
+                self._write_chunks(path, chunks)
+            finally:
+                self._log_fh_lock.release()
+    
+    def _write_chunks(self, path, chunks):
+        if not chunks:
+            return
+        if self._log_fh is None or self._log_fh.name != path:
+            self._open_log_file(path)
+        self._log_fh.write(b"".join(chunks))
+        # Errors are flushed right away so they survive a crash
+        self._log_fh.flush()
+    
+    def _open_log_file(self, path):
+        """Close the current log file handle (if any) and open the given log file for appending."""
+        if self._log_fh is not None:
+            self._log_fh.close()
+        self._log_fh = open(path, 'ab', buffering=65536)
+    
+    def close(self):
+        """Write any pending entries and close the log file handle."""
+        with self._log_fh_lock:
+            while self._pending:
+                entry_path, entry = self._pending.popleft()
+                self._write_chunks(entry_path, [entry])
+            if self._log_fh is not None:
+                self._log_fh.close()
+                self._log_fh = None
+    
+    def _schedule_storage_cleanup(self, force: bool = False):
+        """
+        Run manage_log_storage on a background thread if the cleanup interval has elapsed
+        (or force is set) and no cleanup is already running.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_cleanup_ts <= self._cleanup_interval_s:
+            return
+        if self._cleanup_thread is not None and self._cleanup_thread.is_alive():
+            return
+        self._last_cleanup_ts = now
+        self._cleanup_thread = threading.Thread(target=self.manage_log_storage, daemon=True)
+        self._cleanup_thread.start()
+    
     def manage_log_storage(self):
         """
         Manage log storage by enforcing maximum number of files, 
         maximum age, and maximum total size constraints.
         """
-        # Get all log files with their stats
-        log_files = self._get_log_files_with_stats()
+        # Get all log files with their stats and total size, in a single directory scan
+        log_files, total_size_mb = self._get_log_files_with_stats()
         
-        # Apply constraints in order of priority
+        # Apply constraints in order of priority, each one passing on the files it kept
         # 1. Remove old files beyond max age
-        self._remove_old_logs(log_files)
-        
-        # Re-scan log files after age-based cleanup
-        log_files = self._get_log_files_with_stats()
+        kept = self._remove_old_logs(log_files)
+        if len(kept) != len(log_files):
+            total_size_mb = sum(size for _, size, _ in kept)
         
         # 2. Remove files if total size exceeds max
-        self._enforce_max_size(log_files)
-        
-        # Re-scan log files after size-based cleanup
-        log_files = self._get_log_files_with_stats()
+        if total_size_mb > self.max_total_size_mb:
+            kept = self._enforce_max_size(kept, total_size_mb)
         
         # 3. Remove excess files beyond max count
-        self._enforce_max_files(log_files)
+        if len(kept) > self.max_log_files:
+            self._enforce_max_files(kept)
     
-    def _get_log_files_with_stats(self) -> List[Tuple[str, float, datetime.datetime]]:
+    def _get_log_files_with_stats(self) -> Tuple[List[Tuple[str, float, float]], float]:
         """
-        Get list of log files with their stats (path, size, creation time).
+        Get list of log files with their stats (path, size, creation time), in directory order.
         
         Returns:
-            List of tuples containing (file_path, size_in_mb, creation_time)
+            List of tuples containing (file_path, size_in_mb, creation_time), and the total size in MB.
+            Creation times are in epoch seconds
         """
         log_files = []
-        for file_path in glob.glob(os.path.join(self.log_directory, "*.log")):
-            # Skip the current log file
-            if os.path.abspath(file_path) == os.path.abspath(self.log_file_path):
-                continue
-                
-            # Get file stats
-            stats = os.stat(file_path)
-            size_mb = stats.st_size / (1024 * 1024)  # Convert bytes to MB
-            
-            # Try to extract date from filename for more accurate age determination
-            filename = os.path.basename(file_path)
-            file_date = self._extract_date_from_filename(filename)
+        total_size_mb = 0.0
+        # Every entry comes from the log directory, so the current log file is found by name
+        current_log_name = os.path.basename(self.log_file_path)
+        with os.scandir(self.log_directory) as entries:
+            for entry in entries:
+                # Skip the current log file and anything that is not a log file
+                if not entry.name.endswith(".log") or entry.name == current_log_name or not entry.is_file(follow_symlinks=False):
+                    continue
+                    
+                # Get file stats
+                stats = entry.stat(follow_symlinks=False)
+                log_file = self._log_file_stats(entry.path, entry.name, stats)
+                total_size_mb += log_file[1]
+                log_files.append(log_file)
             
-            if file_date:
-                # Use the date from the filename
-                creation_time = file_date
-            else:
-                # Fall back to file system times
-                ctime = datetime.datetime.fromtimestamp(stats.st_ctime)
-                mtime = datetime.datetime.fromtimestamp(stats.st_mtime)
-                creation_time = min(ctime, mtime)
-            
-            log_files.append((file_path, size_mb, creation_time))
-            
-        # Sort by creation time (oldest first)
-        return sorted(log_files, key=lambda x: x[2])
+        return log_files, total_size_mb
+    
+    def _log_file_stats(self, file_path: str, filename: str, stats: os.stat_result) -> Tuple[str, float, float]:
+        """
+        Build the (file_path, size_in_mb, creation_time) tuple of a log file, with the creation time in epoch seconds.
+        """
+        size_mb = stats.st_size / (1024 * 1024)  # Convert bytes to MB
+        
+        # Try to extract date from filename for more accurate age determination
+        file_date = self._extract_date_from_filename(filename)
+
+        if file_date:
+            # Use the date from the filename
+            creation_time = file_date.timestamp()
+        else:
+            # Fall back to file system times
+            creation_time = min(stats.st_ctime, stats.st_mtime)
+        
+        return (file_path, size_mb, creation_time)
     
     def _extract_date_from_filename(self, filename: str) -> Optional[datetime.datetime]:
         """
@@ -171,11 +273,8 @@ class ErrorLogger:
         Returns:
             Datetime object if successful, None otherwise
         """
-        import re
-        
         # Try to match YYYYMMDD pattern
-        daily_pattern = re.compile(r'error_log_(\d{8})\.log')
-        match = daily_pattern.match(filename)
+        match = _DAILY_RE.match(filename)
         if match:
             try:
                 date_str = match.group(1)
@@ -184,8 +283,7 @@ class ErrorLogger:
                 pass
         
         # Try to match YYYYMMDD_HHMMSS pattern
-        timestamp_pattern = re.compile(r'error_log_(\d{8}_\d{6})\.log')
-        match = timestamp_pattern.match(filename)
+        match = _TS_RE.match(filename)
         if match:
             try:
                 date_str = match.group(1)
@@ -195,60 +293,79 @@ class ErrorLogger:
                 
         return None
     
-    def _remove_old_logs(self, log_files: List[Tuple[str, float, datetime.datetime]]):
+    def _remove_old_logs(self, log_files: List[Tuple[str, float, float]]) -> List[Tuple[str, float, float]]:
         """
         Remove log files older than max_log_age_days.
         
         Args:
             log_files: List of tuples containing (file_path, size_in_mb, creation_time)
+            
+        Returns:
+            The log files that were kept
         """
-        now = datetime.datetime.now()
-        max_age = datetime.timedelta(days=self.max_log_age_days)
+        cutoff = time.time() - self.max_log_age_days * 86400
         
-        for file_path, _, creation_time in log_files:
-            if now - creation_time > max_age:
+        kept = []
+        for log_file in log_files:
+            file_path, _, creation_time = log_file
+            if creation_time < cutoff:
                 try:
                     os.remove(file_path)
+                    continue
                 except OSError:
                     pass  # Failed to remove file, just continue
+            kept.append(log_file)
+        return kept
     
-    def _enforce_max_size(self, log_files: List[Tuple[str, float, datetime.datetime]]):
+    def _enforce_max_size(self, log_files: List[Tuple[str, float, float]], total_size_mb: Optional[float] = None) -> List[Tuple[str, float, float]]:
         """
         Remove oldest log files if total size exceeds max_total_size_mb.
         
         Args:
             log_files: List of tuples containing (file_path, size_in_mb, creation_time)
+            total_size_mb: Total size of the log files, if already known
+            
+        Returns:
+            The log files that were kept
         """
         # Calculate total size
-        total_size_mb = sum(size for _, size, _ in log_files)
+        if total_size_mb is None:
+            total_size_mb = sum(size for _, size, _ in log_files)
+        if total_size_mb <= self.max_total_size_mb:
+            return log_files
         
         # Remove oldest files until we're under the limit
-        for file_path, size_mb, _ in log_files:
+        log_files = sorted(log_files, key=lambda x: x[2])
+        kept = []
+        for i, (file_path, size_mb, _) in enumerate(log_files):
             if total_size_mb <= self.max_total_size_mb:
+                kept.extend(log_files[i:])
                 break
                 
             try:
                 os.remove(file_path)
                 total_size_mb -= size_mb
             except OSError:
-                pass  # Failed to remove file, just continue
+                kept.append(log_files[i])  # Failed to remove file, just continue
+        return kept
     
-    def _enforce_max_files(self, log_files: List[Tuple[str, float, datetime.datetime]]):
+    def _enforce_max_files(self, log_files: List[Tuple[str, float, float]]):
         """
         Remove oldest log files if count exceeds max_log_files.
         
         Args:
             log_files: List of tuples containing (file_path, size_in_mb, creation_time)
         """
-        # Remove oldest files until we're under the limit
-        files_to_remove = max(0, len(log_files) - self.max_log_files)
+        # Remove oldest files until we're under the limit, only picking out the ones to remove
+        files_to_remove = len(log_files) - self.max_log_files
+        if files_to_remove <= 0:
+            return
         
-        for i in range(files_to_remove):
-            if i < len(log_files):
-                try:
-                    os.remove(log_files[i][0])
-                except OSError:
-                    pass  # Failed to remove file, just continue
+        for file_path, _, _ in heapq.nsmallest(files_to_remove, log_files, key=lambda x: x[2]):
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass  # Failed to remove file, just continue
 
 if __name__ == "__main__": 
     error_logger = ErrorLogger("src/logs",None, 100,30)
@@ -1,14 +1,45 @@
 from typing import Dict, Any
+from functools import lru_cache
 import sys 
 from pathlib import Path
 
 # Add parent directory to Python path
-sys.path.append(str(Path(__file__).parent.parent))
+_src_dir = str(Path(__file__).parent.parent)
+if _src_dir not in sys.path:
+    sys.path.append(_src_dir)
 from utils.logger import logger
 
-required_fields = ["context", "operation", "data"]
-context_values = ["device", "configuration", "location", "sensor"]
-operations_values = ["read", "create", "update", "delete"]
+context_values = frozenset(["device", "configuration", "location", "sensor"])
+operations_values = frozenset(["read", "create", "update", "delete"])
+
+# Required fields of each part of the configuration
+_SENSOR_FIELDS = (
+    ('id', str),
+    ('mode', str),
+    ('margin', (int, float)),
+    ('maxValveTimeOpen', (int, float)),
+    # ('targetPh', (int, float)),
+    ('devicePort', str),
+    ('checkInterval', (int, float)),
+    ('createdAt', str),
+)
+_LOCATION_REQUIRED = frozenset(('id', 'name', 'createdAt', 'sensors'))
+_DEVICE_CONFIGURATION_REQUIRED = frozenset(("id", "name", "createdAt", "locations"))
+_CONFIG_REQUIRED = frozenset(('id', 'name', 'createdAt', 'status', 'configurations'))
+_CONFIGURATION_REQUIRED = frozenset(('id', 'createdAt', 'locations'))
+
+_SENSOR_MODES = frozenset(('acidic', 'alkaline', "auto"))
+
+
+@lru_cache(maxsize=None)
+def _sensor_fields_to_check(ignored_fields: frozenset):
+    """Required sensor fields and types, without the ignored ones. Computed once per set of ignored fields."""
+    return tuple((field, field_type) for field, field_type in _SENSOR_FIELDS if field not in ignored_fields)
+
+
+class ConfigValidationError(ValueError):
+    """Raised when a command or configuration received from the server is invalid."""
+
 
 class Validator: 
     def __init__(self):
@@ -16,96 +47,108 @@ class Validator:
 
     def validateConfigOperationCommand(self, cmd):
         """Parses the commands received from the server for device configuration operations""" 
-        for field in required_fields: 
-            if field not in cmd:
-                raise ValueError(f"Missing required command field: {field}")
-        if not cmd["context"] in context_values: 
-            raise ValueError("The operation context you provided is invalid.")
-        if not cmd["operation"] in operations_values: 
-            raise ValueError("The operation type you provided is invalid.")
+        try:
+            context, operation, _ = cmd["context"], cmd["operation"], cmd["data"]
+        except KeyError as err:
+            raise ConfigValidationError(f"Missing required command field: {err.args[0]}")
+        if not isinstance(context, str) or not context in context_values: 
+            raise ConfigValidationError("The operation context you provided is invalid.")
+        if not isinstance(operation, str) or not operation in operations_values: 
+            raise ConfigValidationError("The operation type you provided is invalid.")
+
+    def validate_and_strip(self, data: Dict[str, Any], validate, forbidden_keys):
+        """Removes the keys that can not be updated and validates the rest with the given validation method (if any).
+        Returns None if the data is invalid."""
+        offending = data.keys() & forbidden_keys
+        if offending: 
+            logger.info("The new config has attributes which will be removed: %s", ", ".join(sorted(offending)))
+            for key in offending: 
+                data.pop(key)
+        if validate is not None and not validate(data, forbidden_keys):
+            return None
+        return data
         
-    def _validate_sensor(self, sensor: Dict[str, Any]) -> bool:
-        """Validate sensor configuration."""
-        required_fields = {
-            'id': str,
-            'mode': str,
-            'margin': (int, float),
-            'maxValveTimeOpen': (int, float),
-            # 'targetPh': (int, float),
-            'devicePort': str,
-            'checkInterval': (int, float),
-            'createdAt': str
-        }
-
-        for field, field_type in required_fields.items():
+    def _validate_sensor(self, sensor: Dict[str, Any], ignored_fields: frozenset = frozenset()) -> bool:
+        """Validate sensor configuration. The ignored fields (e.g. the ones stripped from updates) are not required."""
+        return self._passes(self._check_sensor, sensor, ignored_fields)
+
+    def _validate_location(self, location: Dict[str, Any]) -> bool:
+        """Validate location configuration."""
+        return self._passes(self._check_location, location)
+
+    def _validate_device_configuration(self, device_conf):
+        """Validate device configuration."""
+        return self._passes(self._check_device_configuration, device_conf)
+    
+    def _validate_config(self, config) -> bool:
+        """Validate the complete configuration structure."""
+        try:
+            return self._passes(self._check_config, config)
+        except Exception as e:
+            logger.error("Configuration validation error: %s", e)
+            return False
+
+    def _passes(self, check, *args) -> bool:
+        """Runs a check, logging the first failure it finds."""
+        try:
+            check(*args)
+            return True
+        except ConfigValidationError as e:
+            logger.error(e)
+            return False
+
+    # The checks below raise on the first invalid field, so nothing after it is checked
+
+    def _check_sensor(self, sensor: Dict[str, Any], ignored_fields: frozenset = frozenset()):
+        for field, field_type in _sensor_fields_to_check(ignored_fields):
             if field not in sensor:
-                logger.error(f"Missing required sensor field: {field}")
-                return False
+                raise ConfigValidationError(f"Missing required sensor field: {field}")
             if not isinstance(sensor[field], field_type):
-                logger.error(f"Invalid type for sensor field {field}")
-                return False
+                raise ConfigValidationError(f"Invalid type for sensor field {field}")
 
         # Additional validation rules
-        if sensor['mode'] not in ['acidic', 'alkaline', "auto"]:
-            logger.error("Invalid sensor mode")
-            return False
+        if sensor['mode'] not in _SENSOR_MODES:
+            raise ConfigValidationError("Invalid sensor mode")
         if not (0 < sensor['margin'] <= 1):
-            logger.error("Invalid margin value")
-            return False
+            raise ConfigValidationError("Invalid margin value")
         if not (1 < sensor['maxValveTimeOpen'] <= 300):
-            logger.error("Invalid maxValveTimeOpen value")
-            return False
+            raise ConfigValidationError("Invalid maxValveTimeOpen value")
         if not (1 <= float(sensor['targetPh']) <= 14):
-            logger.error("Invalid targetPh value")
-            return False
-
-        return True
+            raise ConfigValidationError("Invalid targetPh value")
 
-    def _validate_location(self, location: Dict[str, Any]) -> bool:
-        """Validate location configuration."""
-        required_fields = ['id', 'name', 'createdAt', 'sensors']
-        if not all(field in location for field in required_fields):
-            logger.error("Some fields are missing in the location data")
-            return False
+    def _check_location(self, location: Dict[str, Any]):
+        if not _LOCATION_REQUIRED.issubset(location):
+            raise ConfigValidationError("Some fields are missing in the location data")
         
         if not isinstance(location['sensors'], list):
-            return False
+            raise ConfigValidationError("The location sensors must be a list")
 
-        return all(self._validate_sensor(sensor) for sensor in location['sensors'])
+        for sensor in location['sensors']:
+            self._check_sensor(sensor)
 
-    def _validate_device_configuration(self, device_conf):
-        """Validate device configuration."""
-        required_fields = ["id", "name", "createdAt", "locations"]
-        if not all(field in device_conf for field in required_fields):
-            logger.error("Some fields are missing in the device configuraion data")
-            return False
+    def _check_device_configuration(self, device_conf):
+        if not _DEVICE_CONFIGURATION_REQUIRED.issubset(device_conf):
+            raise ConfigValidationError("Some fields are missing in the device configuraion data")
 
-        return all(self._validate_location(location) for location in device_conf['locations'])
-    
-    def _validate_config(self, config) -> bool:
-        """Validate the complete configuration structure."""
-        try:
-            required_fields = ['id', 'name', 'createdAt', 'status', 'configurations']
-            if not all(field in config for field in required_fields):
-                return False
+        for location in device_conf['locations']:
+            self._check_location(location)
 
-            if not isinstance(config['configurations'], list):
-                return False
+    def _check_config(self, config):
+        if not _CONFIG_REQUIRED.issubset(config):
+            raise ConfigValidationError("Some fields are missing in the configuration")
 
-            for configuration in config['configurations']:
-                if not all(field in configuration for field in ['id', 'createdAt', 'locations']):
-                    return False
-                
-                if not isinstance(configuration['locations'], list):
-                    return False
+        if not isinstance(config['configurations'], list):
+            raise ConfigValidationError("The configurations must be a list")
 
-                if not all(self._validate_location(location) for location in configuration['locations']):
-                    return False
+        for configuration in config['configurations']:
+            if not _CONFIGURATION_REQUIRED.issubset(configuration):
+                raise ConfigValidationError("Some fields are missing in the device configuraion data")
+            
+            if not isinstance(configuration['locations'], list):
+                raise ConfigValidationError("The configuration locations must be a list")
 
-            return True
-        except Exception as e:
-            logger.error(f"Configuration validation error: {e}")
-            return False
+            for location in configuration['locations']:
+                self._check_location(location)
 
 if __name__ == "__main__": 
     try: 
@@ -1,27 +1,221 @@
 import time
+import heapq
+import os
 
 import sys 
 from pathlib import Path
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from enum import IntFlag
+from collections import deque
 
 
 # Add parent directory to Python path
-sys.path.append(str(Path(__file__).parent.parent))
+_src_dir = str(Path(__file__).parent.parent)
+if _src_dir not in sys.path:
+    sys.path.append(_src_dir)
 try:
     import lgpio
-    chip = lgpio.gpiochip_open(0)
 
 except ImportError:
     from utils.mock_gpio import MockLGPIO 
     lgpio = MockLGPIO()
-    chip = lgpio.gpiochip_open(0)
 
 
 from utils.utils import  AnalogCommunication
-from settings import port_mapper, logger, device_handler
+from settings import port_mapper, logger, device_handler, CONTROLLER_CPU, CONTROLLER_RT_PRIORITY
 
+PUMP_DEBOUNCE_NS = 50_000_000 # Pump toggles closer than this to the previous state change are ignored
 
-gpio_lock = threading.Lock()
+
+class Mode(IntFlag):
+    """Pumps used by a controller mode."""
+    ACIDIC = 1
+    ALKALINE = 2
+    AUTO = ACIDIC | ALKALINE
+
+_MODES = {"acidic": Mode.ACIDIC, "alkaline": Mode.ALKALINE, "auto": Mode.AUTO}
+
+class GpioChip:
+    """
+        Process wide handle of a GPIO chip, shared by every controller.
+        The chip is opened on the first acquire and closed on the last release, and each pin is claimed only once.
+    """
+    def __init__(self, gpiochip=0):
+        self._gpiochip = gpiochip
+        self.handle = None
+        self._refcount = 0
+        self._claimed = set()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.handle is None:
+                self.handle = lgpio.gpiochip_open(self._gpiochip)
+            self._refcount += 1
+            return self.handle
+
+    def release(self):
+        with self._lock:
+            if self._refcount == 0:
+                return
+            self._refcount -= 1
+            if self._refcount == 0:
+                lgpio.gpiochip_close(self.handle)
+                self.handle = None
+                self._claimed.clear()
+
+    def claim_output(self, pin, level=1):
+        with self._lock:
+            if pin in self._claimed:
+                return
+            lgpio.gpio_claim_output(self.handle, pin, level=level)
+            self._claimed.add(pin)
+
+    def write(self, pin, level):
+        lgpio.gpio_write(self.handle, pin, level)
+
+
+gpio_chip = GpioChip(0)
+
+
+class GpioWorker:
+    """
+        Single thread that owns the pump GPIO writes. Writes and pulse starts are queued and run right away,
+        and the end of every pulse is kept in a deadline heap, so a long pulse does not hold back the other pumps.
+        A pulse on a pin that is already open extends it, so the valve stays open for the sum of both pulses.
+        A single write (e.g. a manual toggle) takes over the pin and ends the pulse running on it.
+    """
+    def __init__(self):
+        self._pending = deque()
+        # (deadline, sequence, pin) of the writes that end the running pulses. Entries that no longer match
+        # the pin's current deadline were superseded by an extension or a single write and are skipped
+        self._deadlines = []
+        self._sequence = 0
+        # pin -> [deadline, closing level, on_done callbacks] of the open pulses
+        self._open = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        # Runs the on_done callbacks, which emit to the client, so a slow emit never delays closing a valve.
+        # A single thread keeps them in order
+        self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpio-callbacks")
+
+    def _submit(self, command):
+        # Each queued command holds a reference, so the chip is not closed before it runs
+        gpio_chip.acquire()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="gpio", daemon=True)
+                self._thread.start()
+            self._pending.append(command)
+            self._cond.notify()
+
+    def write(self, pin, level):
+        """Queues a single write of the given level."""
+        self._submit((pin, level, None, None))
+
+    def pulse(self, pin, duration, on_done=None):
+        """Queues a pulse: the pin is set low (valve open) for duration seconds, then high. on_done is called after."""
+        self._submit((pin, 0, duration, on_done))
+
+    def _run(self):
+        # The pulse timings are set by this thread, so it gets the real time scheduling too
+        set_realtime_scheduling()
+        while True:
+            with self._cond:
+                # Sleeps until a command is queued or the earliest pulse is due to end
+                while not self._pending:
+                    if self._deadlines:
+                        timeout = self._deadlines[0][0] - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+                commands = list(self._pending)
+                self._pending.clear()
+                now = time.monotonic()
+                due = []
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    deadline, _, pin = heapq.heappop(self._deadlines)
+                    pulse = self._open.get(pin)
+                    if pulse is not None and pulse[0] == deadline:
+                        del self._open[pin]
+                        due.append((pin, pulse[1], pulse[2]))
+
+            for pin, level, callbacks in due:
+                self._finish(pin, level, callbacks)
+
+            for pin, level, duration, on_done in commands:
+                if duration is None:
+                    with self._cond:
+                        pulse = self._open.pop(pin, None)
+                    callbacks = (on_done,) if pulse is None else (on_done, *pulse[2])
+                    self._finish(pin, level, callbacks)
+                    continue
+                with self._cond:
+                    pulse = self._open.get(pin)
+                    if pulse is not None:
+                        # Already open: the valve stays open for this pulse too, after the current one
+                        pulse[0] += duration
+                        pulse[2].append(on_done)
+                        self._schedule(pulse[0], pin)
+                        continue
+                # Deadline taken before the write, so the write time is part of the pulse
+                deadline = time.monotonic() + duration
+                try:
+                    gpio_chip.write(pin, level)
+                except Exception as err:
+                    logger.error("GPIO write on pin %s failed: %s", pin, err)
+                with self._cond:
+                    self._open[pin] = [deadline, 1 - level, [on_done]]
+                    self._schedule(deadline, pin)
+
+    def _schedule(self, deadline, pin):
+        self._sequence += 1
+        heapq.heappush(self._deadlines, (deadline, self._sequence, pin))
+
+    def _finish(self, pin, level, callbacks):
+        """Runs the write that completes one or more commands, releasing their chip references and scheduling their on_done."""
+        try:
+            gpio_chip.write(pin, level)
+        except Exception as err:
+            logger.error("GPIO write on pin %s failed: %s", pin, err)
+        finally:
+            for _ in callbacks:
+                gpio_chip.release()
+            callbacks = [on_done for on_done in callbacks if on_done is not None]
+            if callbacks:
+                self._callbacks.submit(self._run_callbacks, callbacks)
+
+    @staticmethod
+    def _run_callbacks(callbacks):
+        for on_done in callbacks:
+            try:
+                on_done()
+            except Exception as err:
+                logger.error(err)
+
+
+gpio_worker = GpioWorker()
+
+
+def set_realtime_scheduling(cpu=CONTROLLER_CPU, priority=CONTROLLER_RT_PRIORITY):
+    """
+        Pins the calling thread to the given core and runs it with the SCHED_FIFO policy.
+        Threads started from it inherit both. If the system does not allow it, the default scheduling is kept.
+    """
+    name = threading.current_thread().name
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {cpu})
+        except OSError as err:
+            logger.warning("Could not pin the %s thread to core %s: %s", name, cpu, err)
+    if priority is not None and hasattr(os, "sched_setscheduler"):
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        except OSError as err:
+            logger.warning("Could not set the real time priority of the %s thread: %s", name, err)
 
 
 
@@ -45,31 +239,59 @@ class PHController:
         self.target_ph = float(target_ph)
         self.max_pump_time = float(max_pump_time)
         self.margin = float(margin)
-        self.mode = mode
+        # pH range accepted without adjustment
+        self._ph_low = self.target_ph - self.margin
+        self._ph_high = self.target_ph + self.margin
         self.send_log_to_client = send_log_to_client
         self.update_client_pump_status = update_client_pump_status
         self.location = location
         self.init_sensor()
+        self.set_mode(mode)
         self.init_gpio()
     
     def init_sensor(self): 
         self.is_running = False
         self.is_pumping_acid = False
         self.is_pumping_base = False
+        # Time of the last state change of each pump, for the toggle debounce
+        self._last_change_ns = {"acidic": 0, "alkaline": 0}
+        self._gpio_acquired = False
+        # Guards the pumping flags, which are also cleared from the GPIO worker when a pulse ends
+        self._state_lock = threading.Lock()
         self.alkaline_pump_pin, self.acidic_pump_pin = port_mapper.get_pump_pins(self.device_port)
+        self._pin_label = {self.acidic_pump_pin: "acidic", self.alkaline_pump_pin: "alkaline"}
         self.comunicator = AnalogCommunication(
             sensor_config=port_mapper.get_input_number(self.device_port)
         )
 
     def set_mode(self, mode):
-        if mode != "acidic" or mode != "alkaline" or mode != "auto":
+        if mode not in _MODES:
             raise NameError("You are trying to set the controller mode to an invalid mode. Available options: acidic | alkaline | auto")
-        self.mode = mode
+        self.mode = _MODES[mode]
+        self._build_pump_lut()
+
+    def _build_pump_lut(self):
+        """
+            Pump to use by pH side, indexed by whether the solution is acidic: (acid pump entry, base pump entry).
+            An entry is None when the mode does not use that pump.
+        """
+        self._pump_lut = (
+            ("acidic", self.acidic_pump_pin) if self.mode & Mode.ACIDIC else None,
+            ("alkaline", self.alkaline_pump_pin) if self.mode & Mode.ALKALINE else None,
+        )
 
     def init_gpio(self):  
-        print("Setting GPIO mode.")
-        lgpio.gpio_claim_output(chip, self.alkaline_pump_pin, level=1)
-        lgpio.gpio_claim_output(chip, self.acidic_pump_pin, level=1)
+        logger.debug("Setting GPIO mode.")
+        gpio_chip.acquire()
+        self._gpio_acquired = True
+        gpio_chip.claim_output(self.alkaline_pump_pin, level=1)
+        gpio_chip.claim_output(self.acidic_pump_pin, level=1)
+
+    def release_gpio(self):
+        """Drops this controller's reference to the GPIO chip. Safe to call more than once."""
+        if self._gpio_acquired:
+            self._gpio_acquired = False
+            gpio_chip.release()
 
     def read_ph(self):
         try: 
@@ -77,7 +299,7 @@ class PHController:
             return self.comunicator.get_read()
         except Exception as err: 
             logger.error(err)
-            self.send_log_to_client("error", "An error occured while trying to aquire pH data: {err}", self.location )
+            self.send_log_to_client("error", f"An error occured while trying to aquire pH data: {err}", self.location )
             
     def calculate_pump_time(self, current_ph):
 
@@ -87,27 +309,19 @@ class PHController:
         return pump_time
 
     def determine_pump(self, current_ph):
-        is_acidic = current_ph < self.target_ph ## if the solution is acidic, you need to pump a base solution
-        define_base_pump = self.mode == "alkaline" or self.mode == "auto"
-        define_acid_pump = self.mode == "acidic" or self.mode == "auto"
-
-        if is_acidic and define_base_pump:
-            logger.info("Base pump activated!")
-            pump_pin = self.alkaline_pump_pin
-            pump = "alkaline"
-        elif not is_acidic and define_acid_pump:
-            logger.info("Acidic pump activated!")
-            pump_pin = self.acidic_pump_pin
-            pump = "acidic"
-        else:
-            return  # pH is at target, no adjustment needed
-        return (pump, pump_pin)
-
-    def adjust_ph(self):
+        ## if the solution is acidic, you need to pump a base solution
+        pump_info = self._pump_lut[current_ph < self.target_ph]
+        if pump_info is not None:
+            logger.info("%s pump activated!", "Base" if pump_info[0] == "alkaline" else "Acidic")
+        return pump_info
+
+    def adjust_ph(self, current_ph=None):
+        """Adjusts the pH, using the given read when the pH was just acquired, or reading it otherwise."""
         logger.info("Checking the current pH")
-        current_ph = self.read_ph()
-        logger.info(f"Current pH: {current_ph}")
-        if self.target_ph - self.margin <= current_ph <= self.target_ph + self.margin:
+        if current_ph is None:
+            current_ph = self.read_ph()
+        logger.info("Current pH: %s", current_ph)
+        if self._ph_low <= current_ph <= self._ph_high:
             logger.info("pH value with the margin values. No adjustment necessary")
             return
         pump_info = self.determine_pump(current_ph)
@@ -117,57 +331,74 @@ class PHController:
             return 
         pump, pump_pin = pump_info
         pump_time = self.calculate_pump_time(current_ph)
-        t = threading.Thread(target=self.change_pump_state, args=(pump, pump_pin , pump_time))
-        t.start()
+        self.change_pump_state(pump, pump_pin, pump_time)
+
+    def _debounced(self, pump):
+        """Returns True if the pump changed state less than PUMP_DEBOUNCE_NS ago, otherwise records the change."""
+        now = time.monotonic_ns()
+        if now - self._last_change_ns[pump] < PUMP_DEBOUNCE_NS:
+            return True
+        self._last_change_ns[pump] = now
+        return False
 
     def change_pump_state(self, pump, pump_pin, pump_time):
-        if pump == "acidic": 
-            self.is_pumping_acid = True
-            self.activate_pump(pump_pin, pump_time)
-            self.is_pumping_acid = False
-        else: 
-            self.is_pumping_base = True
-            self.activate_pump(pump_pin, pump_time)
-            self.is_pumping_base = False
+        self._last_change_ns[pump] = time.monotonic_ns()
+        with self._state_lock:
+            if pump == "acidic": 
+                self.is_pumping_acid = True
+            else: 
+                self.is_pumping_base = True
+
+        def pump_stopped():
+            with self._state_lock:
+                if pump == "acidic": 
+                    self.is_pumping_acid = False
+                else: 
+                    self.is_pumping_base = False
+        self.activate_pump(pump_pin, pump_time, pump_stopped)
         
-    def activate_pump(self, pump_pin, pump_time):
-        self.send_client_pump_information(pump_pin, f"Pumping for {round(pump_time,2)} seconds", True)
-        logger.info(f"Pumping for {round(pump_time,2)} seconds")
-
-        with gpio_lock:  
-            lgpio.gpio_write(chip, pump_pin, 0)
-            time.sleep(pump_time)
-            lgpio.gpio_write(chip, pump_pin, 1)
-
-        self.send_client_pump_information(pump_pin, "Closing valve", False)
+    def activate_pump(self, pump_pin, pump_time, on_done=None):
+        """Queues the pump pulse on the GPIO worker and returns right away. on_done is called once the valve is closed."""
+        # Formatted once, as the client needs the text anyway
+        message = f"Pumping for {round(pump_time,2)} seconds"
+        self.send_client_pump_information(pump_pin, message, True)
+        logger.info(message)
+
+        def valve_closed():
+            self.send_client_pump_information(pump_pin, "Closing valve", False)
+            if on_done is not None:
+                on_done()
+        gpio_worker.pulse(pump_pin, pump_time, valve_closed)
           
     def send_client_pump_information(self, pump_pin, log, status): 
-        self.update_client_pump_status(self.location, "acidic" if pump_pin==self.acidic_pump_pin else self.alkaline_pump_pin, status)
+        self.update_client_pump_status(self.location, self._pin_label[pump_pin], status)
         self.send_log_to_client("info", log, self.location)
 
     def toggle_pump(self, pump, overide_status=None): 
-        logger.info(f"Toggle {pump} pump")
-        if pump == "acidic": 
-            if overide_status != None: 
-                self.is_pumping_acid = not overide_status
-            action = "Opening" if not self.is_pumping_acid else "Closing"
-            lgpio.gpio_write(chip, self.acidic_pump_pin, 0 if not self.is_pumping_acid else 1)
-            
-            self.send_log_to_client("info", f"{action} acidic pump", self.location)
-            self.is_pumping_acid = not self.is_pumping_acid
-        else: 
-            if overide_status != None: 
-                self.is_pumping_base = not overide_status
-            action = "Opening" if not self.is_pumping_base else "Closing"
-            lgpio.gpio_write(chip, self.alkaline_pump_pin, 0 if not self.is_pumping_acid else 1)            
-            self.send_log_to_client("info", f"{action} alkaline pump", self.location)
-            self.is_pumping_base = not self.is_pumping_base
-        status = self.is_pumping_acid if pump == "acidic" else self.is_pumping_base
+        logger.info("Toggle %s pump", pump)
+        if self._debounced(pump):
+            logger.info("Ignoring %s pump toggle, the pump changed state less than %d ms ago", pump, PUMP_DEBOUNCE_NS // 1_000_000)
+            return (pump, self.is_pumping_acid if pump == "acidic" else self.is_pumping_base)
+        with self._state_lock:
+            if pump == "acidic": 
+                if overide_status != None: 
+                    self.is_pumping_acid = not overide_status
+                action = "Opening" if not self.is_pumping_acid else "Closing"
+                gpio_worker.write(self.acidic_pump_pin, 0 if not self.is_pumping_acid else 1)
+                self.is_pumping_acid = not self.is_pumping_acid
+            else: 
+                if overide_status != None: 
+                    self.is_pumping_base = not overide_status
+                action = "Opening" if not self.is_pumping_base else "Closing"
+                gpio_worker.write(self.alkaline_pump_pin, 0 if not self.is_pumping_base else 1)            
+                self.is_pumping_base = not self.is_pumping_base
+            status = self.is_pumping_acid if pump == "acidic" else self.is_pumping_base
+        self.send_log_to_client("info", f"{action} {pump} pump", self.location)
         return (pump, status)
          
     def stop(self): 
         self.is_running = False
-        lgpio.gpiochip_close(chip)
+        self.release_gpio()
         logger.info("Monitorization stopped")
  
 
@@ -178,6 +409,14 @@ class SensorManager:
         self.is_running = False
         self.socket = socket
         self.send_log_to_client = send_log
+        self.thread = None
+        self._stop_event = threading.Event()
+        # Client events raised by the controllers loop, sent together at the end of each tick
+        self._pending_events = deque()
+        # (controller, location id, pH monitor period) of each registered sensor, read by the controllers loop
+        self._hot = ()
+        # Controllers by (location name, device port), reused by the manual pump toggles
+        self._by_location = {}
         self._register_device_listenners()
         self.device = device_handler.get_config()
 
@@ -190,20 +429,44 @@ class SensorManager:
         status = not loc["isAcidPumping"] if pump_type == "acidic" else not loc["isBasePumping"]
         location_sensor = loc["sensors"][0]
         
-        sensor = PHController(
-            location=loc["name"],
-            send_log_to_client=self.send_log_to_client,
-            update_client_pump_status=self.update_client_pump_status,
-            device_port=location_sensor["devicePort"],
-            target_ph=location_sensor["targetPh"],
-            max_pump_time=location_sensor["maxValveTimeOpen"],
-            margin=location_sensor["margin"],
-            mode=location_sensor["mode"]
-        ) 
+        key = (loc["name"], location_sensor["devicePort"])
+        sensor = self._by_location.get(key)
+        if sensor is None:
+            sensor = PHController(
+                location=loc["name"],
+                send_log_to_client=self.send_log_to_client,
+                update_client_pump_status=self.update_client_pump_status,
+                device_port=location_sensor["devicePort"],
+                target_ph=location_sensor["targetPh"],
+                max_pump_time=location_sensor["maxValveTimeOpen"],
+                margin=location_sensor["margin"],
+                mode=location_sensor["mode"]
+            ) 
+            self._by_location[key] = sensor
 
         pump, status = sensor.toggle_pump(pump_type, status)
 
+    def _queue_event(self, fn, *args):
+        """Queues a client event. Events from the controllers loop wait for the end of its tick, the others are sent right away."""
+        self._pending_events.append((fn, args))
+        if threading.current_thread() is not self.thread:
+            self._flush_events()
+
+    def _flush_events(self):
+        while True:
+            try:
+                fn, args = self._pending_events.popleft()
+            except IndexError:
+                return
+            fn(*args)
+
+    def _queue_log(self, type, desc, location):
+        self._queue_event(self.send_log_to_client, type, desc, location)
+
     def update_client_pump_status(self, location, pump, status): 
+        self._queue_event(self._emit_pump_status, location, pump, status)
+
+    def _emit_pump_status(self, location, pump, status): 
         logger.info("Sending client the pump status")
         self.socket.emit("update_pump_status", {
             "deviceID": self.device["id"],
@@ -220,7 +483,7 @@ class SensorManager:
                 "location": loc,
                 "controler": PHController(
                     location=loc["name"],
-                    send_log_to_client=self.send_log_to_client,
+                    send_log_to_client=self._queue_log,
                     update_client_pump_status=self.update_client_pump_status,
                     device_port=sensor["devicePort"],
                     target_ph=sensor["targetPh"],
@@ -230,6 +493,16 @@ class SensorManager:
                 )  
             }
             self.controllers.append(controler)
+            key = (loc["name"], sensor["devicePort"])
+            replaced = self._by_location.get(key)
+            # A controller only built for manual toggles would otherwise keep its GPIO chip reference forever
+            if replaced is not None and all(con["controler"] is not replaced for con in self.controllers):
+                replaced.release_gpio()
+            self._by_location[key] = controler["controler"]
+        self._hot = tuple(
+            (con["controler"], con["location"]["id"], int(con["location"]["sensors"][0]["phMonitorFrequency"]))
+            for con in self.controllers
+        )
     
     def start(self, dataAquisitionInterval):
         logger.info("Starting the Timer")
@@ -237,44 +510,105 @@ class SensorManager:
             self.dataAquisitionInterval = int(dataAquisitionInterval)
        
         self.is_running = True
+        self._stop_event.clear()
         self.thread = threading.Thread(target=self.run_controllers)
         self.thread.start()
 
+    def _build_schedule(self):
+        """
+            Builds the task heap, with (deadline, controller index, period) entries.
+            The index -1 is the data acquisition of every controller, the others the pH adjustment of that controller.
+        """
+        start = time.monotonic()
+        tasks = [(-1, self.dataAquisitionInterval)]
+        for i, (_, _, period) in enumerate(self._hot):
+            tasks.append((i, period))
+        for i, period in tasks:
+            if period <= 0:
+                raise ValueError(f"Invalid task period: {period}")
+        schedule = [(start, i, period) for i, period in tasks]
+        heapq.heapify(schedule)
+        return schedule
+
     def run_controllers(self): 
-        time_ellapsed = 0
+        set_realtime_scheduling()
         try:
+            schedule = self._build_schedule()
+            hot = self._hot
+            send = self.send_data
+            monotonic = time.monotonic
             while self.is_running:
+                # Sleep until the next task is due, waking up right away if the controllers are paused or stopped
+                deadline = schedule[0][0]
+                if self._stop_event.wait(max(0, deadline - monotonic())):
+                    break
+
+                # Every task due at this deadline runs in the same tick. Deadlines stay on the original grid
+                # so they do not drift, skipping the ones already missed
+                now = monotonic()
+                acquire = False
+                adjust = set()
+                while schedule[0][0] <= deadline:
+                    task_deadline, i, period = heapq.heappop(schedule)
+                    if i < 0:
+                        acquire = True
+                    else:
+                        adjust.add(i)
+                    next_deadline = task_deadline + period
+                    if next_deadline < now:
+                        next_deadline += ((now - next_deadline) // period + 1) * period
+                    heapq.heappush(schedule, (next_deadline, i, period))
+
                 send_data = []
-                for i in range(len(self.controllers)): 
-                    con = self.controllers[i]
-                    controler = con["controler"]
-                    phMonitorFrequency = int(con["location"]["sensors"][0]["phMonitorFrequency"])
-                    if time_ellapsed%self.dataAquisitionInterval == 0:
+                for i, (controler, location_id, _) in enumerate(hot): 
+                    read = None
+                    if acquire:
                         read = controler.read_ph()
                         send_data.append({
-                            "id": con["location"]["id"],
+                            "id": location_id,
                             "y": read
                         })
 
-                    if time_ellapsed%phMonitorFrequency == 0:
-                        controler.adjust_ph()
-                if time_ellapsed%self.dataAquisitionInterval == 0:
-                    self.send_data(send_data)
-                time.sleep(1)
-                time_ellapsed = time_ellapsed + 1
+                    if i in adjust:
+                        # A failed adjustment is reported and retried on the next check, the other controllers keep running
+                        try:
+                            # Reuses the read of this tick, so the probe is only sampled once
+                            controler.adjust_ph(read)
+                        except Exception as err:
+                            logger.error("pH adjustment failed at %s: %s", controler.location, err)
+                            self._queue_log("error", f"An error occured while adjusting the pH: {err}", controler.location)
+                if acquire:
+                    try:
+                        send(send_data)
+                    except Exception as err:
+                        logger.error("Could not send the sensor data: %s", err)
+                self._flush_events()
         except Exception as err:
             logger.error(err)
-            lgpio.gpiochip_close(chip)
             logger.info("Operation aborted by the user...")
             self.send_log_to_client("error", f"An error occured during data aquisition: {err}", "Device")
+        finally:
+            self._flush_events()
            
-    def pause_controllers(self): 
+    def _stop_thread(self):
+        """Stops the controllers loop and waits for the current tick to finish."""
         self.is_running = False
+        self._stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def pause_controllers(self): 
+        self._stop_thread()
 
     def stop_controllers(self): 
-        self.is_running = False
+        self._stop_thread()
+        controllers = {id(con["controler"]): con["controler"] for con in self.controllers}
+        controllers.update((id(con), con) for con in self._by_location.values())
+        for controler in controllers.values():
+            controler.release_gpio()
         self.controllers = []
-        lgpio.gpiochip_close(chip)
+        self._hot = ()
+        self._by_location = {}
         logger.info("Monitorization stopped")
 
 
@@ -283,14 +617,14 @@ def notifiy_client(x,y,z):
 
 
 def disconnect_pumps(): 
-    lgpio.gpio_write(chip, 10, 1)
-    lgpio.gpio_write(chip, 9, 1)
+    gpio_chip.write(10, 1)
+    gpio_chip.write(9, 1)
 
 def get_ph_read(controller): 
     pin = controller.acidic_pump_pin
-    lgpio.gpio_write(chip, pin, 0)
+    gpio_chip.write(pin, 0)
     time.sleep(10)
-    lgpio.gpio_write(chip, pin, 1)
+    gpio_chip.write(pin, 1)
 
 def adjust_ph(controller): 
     while True:
@@ -324,4 +658,4 @@ if __name__ == "__main__":
 
     except Exception as err:
         print("Error: ", err) 
-        lgpio.gpiochip_close(chip)
\ No newline at end of file
+        gpio_chip.release()
\ No newline at end of file
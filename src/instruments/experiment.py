@@ -1,22 +1,32 @@
 
 import sys 
+import threading
 from pathlib import Path
 
 
 # Add parent directory to Python path
-sys.path.append(str(Path(__file__).parent.parent))
+_src_dir = str(Path(__file__).parent.parent)
+if _src_dir not in sys.path:
+    sys.path.append(_src_dir)
 
 from datetime import datetime
+from socketio.exceptions import BadNamespaceError
 from instruments.controllers import SensorManager 
 from settings import backup_handler, device, timer, device_handler, logger
 
 DATA_BACKUP_PERIOD = 60
+SENSOR_BATCH_ACQUISITIONS = 5 # Data acquisitions sent together in a single sensor_data event
+SENSOR_BATCH_MAX = 64 # Maximum number of data points held, also while the device is disconnected
 
 class ExperimentHandler: 
     def __init__(self, socket, connection_handler): 
         self.socket = socket 
+        self._socket_emit = socket.emit
         self.connection_handler = connection_handler
         self.sensors = []
+        self._sensor_buf = []
+        self._sensor_buf_lock = threading.Lock()
+        self._buffered_acquisitions = 0
         self.sensor_manager = SensorManager(socket, self.send_data_to_client, self.send_log_to_client)
         self.reset_experimental_data()
 
@@ -37,6 +47,7 @@ class ExperimentHandler:
 
     def update_socket(self, socket):
         self.socket = socket 
+        self._socket_emit = socket.emit
 
     def start_experiment(self, data): 
         logger.info("Starting the experiment")
@@ -49,6 +60,7 @@ class ExperimentHandler:
         logger.info("Pausing the experiment")
         timer.stop()
         self.sensor_manager.pause_controllers()
+        self.flush_sensor_data()
 
     def resume_experiment(self, data): 
         logger.info("Resuming the experiment")
@@ -59,6 +71,7 @@ class ExperimentHandler:
         logger.info("Stoping the experiment")
         timer.stop()
         self.sensor_manager.stop_controllers()
+        self.flush_sensor_data()
         backup_handler.cleanup_experiment()
         self.reset_experimental_data()
 
@@ -107,13 +120,39 @@ class ExperimentHandler:
                 "y": processed_data["y"]
             })
 
-        self.emit("sensor_data", {
+        with self._sensor_buf_lock:
+            self._sensor_buf.extend(data_points)
+            self._buffered_acquisitions += 1
+            flush_due = (self._buffered_acquisitions >= SENSOR_BATCH_ACQUISITIONS
+                         or len(self._sensor_buf) >= SENSOR_BATCH_MAX)
+        if flush_due:
+            self.flush_sensor_data()
+
+    def flush_sensor_data(self): 
+        """
+            Sends the buffered data points, of up to SENSOR_BATCH_ACQUISITIONS data acquisitions, in a single sensor_data event.
+            While the device is disconnected the latest SENSOR_BATCH_MAX points are kept and sent once the connection is back.
+        """
+        with self._sensor_buf_lock:
+            if not self.socket.connected:
+                del self._sensor_buf[:-SENSOR_BATCH_MAX]
+                return
+            batch, self._sensor_buf = self._sensor_buf, []
+            self._buffered_acquisitions = 0
+        if not batch: 
+            return
+        sent = self.emit("sensor_data", {
             "deviceID": device["id"],
-            "data": data_points
+            "data": batch
         })
+        if not sent:
+            # Kept for the next flush, as while disconnected
+            with self._sensor_buf_lock:
+                self._sensor_buf[:0] = batch
+                del self._sensor_buf[:-SENSOR_BATCH_MAX]
 
     def send_log_to_client(self, type, desc, location): 
-        logger.info(f"Sending log to client from location: {location}")
+        logger.info("Sending log to client from location: %s", location)
         log ={
             # "id": uuid.uuid4(),
             "type": type,
@@ -135,6 +174,15 @@ class ExperimentHandler:
 
 
     def emit(self, channel, data): 
-        if self.connection_handler.connected:
-            self.socket.emit(channel, data)
+        if self.socket.connected:
+            # The connection can drop between the check and the emit. Called from the timer and controllers
+            # threads, which would stop on the error
+            try:
+                self._socket_emit(channel, data)
+            except BadNamespaceError as err:
+                logger.warning("Could not send %s, the device is disconnected: %s", channel, err)
+                return False
+            self.connection_handler.register_traffic()
+            return True
+        return False
       
\ No newline at end of file
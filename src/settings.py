@@ -1,21 +1,39 @@
-from config.config_handler import DeviceConfigHandler, Validator
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+from config.config_handler import DeviceConfigHandler, DeviceInputMappingHandler
+from config.validation_handler import Validator
 from utils.timer import IntervalTimer
 from utils.utils import DataBackupHandler
-from config.config_handler import DeviceConfigHandler, DeviceInputMappingHandler
 from utils.logger import logger
 from config.error_logger import ErrorLogger
-config_handler = DeviceConfigHandler()
 validator = Validator()
+config_handler = DeviceConfigHandler(validator=validator)
 backup_handler = DataBackupHandler()
-device_handler = DeviceConfigHandler()
+# Same instance as config_handler, so the config file is parsed once and updates are shared
+device_handler = config_handler
 device = device_handler.get_config()
 timer = IntervalTimer()
 port_mapper = DeviceInputMappingHandler()
 error_logger = ErrorLogger("src/logs",None, 100,30)
 
+# Environment variables are loaded once, when the settings are first imported
+load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env.local")
+
 # Access the server and ping it to keep it alive
 # SERVER_URL="https://sensormonitorss.onrender.com"
-SERVER_URL="http://localhost:8000"
+SERVER_URL=os.getenv("SOCKET_SERVER_URL", "http://localhost:8000")
 PING_URL=f"{SERVER_URL}/health"
 INTERVAL_MINUTES = 10  # How often to ping (in minutes)
-TIMEOUT = 5 # Request timeout in seconds
\ No newline at end of file
+TIMEOUT = 5 # Request timeout in seconds
+
+# Socket.IO packet serializer: "default" (JSON) or "msgpack" (needs the msgpack package
+# and a server using the msgpack parser)
+SOCKET_SERIALIZER = "default"
+
+# Real time scheduling of the controllers and GPIO threads, so pump timings are not skewed by other processes.
+# Off (None) by default. Before setting them (e.g. CONTROLLER_CPU = 3, CONTROLLER_RT_PRIORITY = 80) isolate the core
+# at boot (cmdline.txt: isolcpus=3 nohz_full=3 rcu_nocbs=3) and allow real time priorities for the user
+# (/etc/security/limits.conf: @gpio - rtprio 80).
+CONTROLLER_CPU = None # Core the controllers and GPIO threads are pinned to
+CONTROLLER_RT_PRIORITY = None # SCHED_FIFO priority of the controllers and GPIO threads
@@ -0,0 +1,25 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj, **kwargs) -> str:
+    """Drop-in replacement for json.dumps, using orjson when it is installed.
+    The stdlib formatting options (e.g. separators) are ignored, as orjson always writes compact JSON.
+    numpy values (e.g. the pH reads) are serialized natively, and anything else orjson rejects goes through json."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        except TypeError:
+            pass
+    return json.dumps(obj, **kwargs)
+
+
+def loads(data, **kwargs):
+    """Drop-in replacement for json.loads, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data, **kwargs)
@@ -1,20 +1,22 @@
 import threading
 import time
 
+from utils.logger import logger
+
 class IntervalTimer:
     def __init__(self):
         self.running = False
         self.thread = None
     
     def start(self, interval, callback):
-        print("Starting the Timer")
+        logger.debug("Starting the Timer")
         self.running = True
         self.thread = threading.Thread(target=self._run_interval, args=(interval, callback))
         self.thread.start()
     
     def stop(self):
         self.running = False
-        print("Stopping the Timer")
+        logger.debug("Stopping the Timer")
         if self.thread:
             self.thread.join()
     
@@ -5,9 +5,10 @@ from datetime import datetime
 import uuid
 import os
 import numpy as np
-from scipy import stats
 import random
 
+from utils.logger import logger
+
 simulation_mode= False
 try:
     import adafruit_ads1x15.ads1115 as ADS
@@ -16,13 +17,13 @@ try:
     import board
     i2c = busio.I2C(board.SCL, board.SDA)
     ads = ADS.ADS1115(i2c, address=0x48)
-    print("DEBUG")
+    port_map = [ADS.P0, ADS.P1, ADS.P2, ADS.P3]
+    logger.debug("ADS1115 converter initialized")
 
 except Exception as err:
-    print("Activating simulation mode...", err)
+    logger.warning("Activating simulation mode... %s", err)
     simulation_mode = True
-
-port_map = [ADS.P0, ADS.P1, ADS.P2, ADS.P3]
+    port_map = []
 
 class IncrementalRandomGenerator:
     def __init__(self, min_val=0, max_val=7, increment=0.1):
@@ -44,7 +45,7 @@ def get_config():
         with open('/home/pi/Desktop/RPi_socket_client/config.txt') as json_file:
             return json.load(json_file)
     except Exception as err:
-        print(err)
+        logger.error(err)
 
 class AnalogCommunication:
     """
@@ -58,39 +59,49 @@ class AnalogCommunication:
         self.analog_read = 0
         self.converted_read = 0
         self.ready = True
+        self._channel = None
 
 
     def get_regression_params(self):
         try:
+            # scipy is slow to import, so it is only loaded once a calibration is needed
+            from scipy import stats
             x = np.array([self.sensor_config["acidic_value"], self.sensor_config["alkaline_value"]]).astype(np.float64)
             y = np.array([4,7]).astype(np.float64)
             cal = stats.linregress(x,y)
             return (cal.slope, cal.intercept)
         except Exception as err:
             self.error= True
-            print("Error while getting regression params",err)
+            logger.error("Error while getting regression params: %s", err)
 
     # This method is responsible for getting an analog read of the sensors. The read value corresponds to an average of 20 reads (i.e., 20 by default)
     def get_read(self, NUM_MEAS_FOR_AVG=20):
         analog_avg = self.get_analog_read(NUM_MEAS_FOR_AVG)
         return self.convert_analog(analog_avg)
 
+    def get_channel(self):
+        """Returns the ADS1115 input of the probe, created once and reused by every read."""
+        if self._channel is None:
+            self._channel = AnalogIn(ads, port_map[self.sensor_config["probe"]])
+        return self._channel
+
     def get_analog_read(self, NUM_MEAS_FOR_AVG=20): 
         self.ready=False
         analog_values = np.zeros(NUM_MEAS_FOR_AVG)
+        channel = None
         for i in range(NUM_MEAS_FOR_AVG):
 
             try:
                 if simulation_mode:
                     an_read = random_gen.get_next()
                 else:
-                    probe = self.sensor_config["probe"]
-                    an_read = AnalogIn(ads, port_map[probe]).value
+                    if channel is None:
+                        channel = self.get_channel()
+                    an_read = channel.value
 
                 analog_values[i] = an_read
             except Exception as err:
-                print(err)
-                pass
+                logger.debug("Failed analog read: %s", err)
 
         mask = np.ma.masked_equal(analog_values,0).compressed()
         analog_avg = np.average(mask)
@@ -112,7 +123,7 @@ class AnalogCommunication:
                     self.analog_read = analog_read
                     self.converted_read = round((analog_read-b)/m, 2)
         except Exception as err:
-            print(err)
+            logger.error(err)
             self.error=True
 
 
@@ -129,7 +140,7 @@ class DataBackupHandler:
     def save_data(self, data):
         """Save data to a temporary file"""
         if not hasattr(self, "backup_dir"):
-            print("ERROR: backup_dir not initialized")
+            logger.error("backup_dir not initialized")
             return
 
         try:
@@ -139,30 +150,21 @@ class DataBackupHandler:
 
             # Make sure the directory exists
             if not self.backup_dir.exists():
-                print(f"Creating directory: {self.backup_dir}")
+                logger.debug("Creating directory: %s", self.backup_dir)
                 self.backup_dir.mkdir(parents=True, exist_ok=True)
 
             # Create the file
             backup_file = self.backup_dir / f"exp_chunk_{datetime.timestamp(datetime.now())}_{uuid.uuid4()}.jsonl"
-            print(f"Writing to file: {backup_file}")
+            logger.debug("Writing to file: %s", backup_file)
 
             with open(backup_file, 'w') as f:
                 f.write(json.dumps(data))
                 f.flush()  # Ensure data is written to disk
                 os.fsync(f.fileno())  # Force OS to write to physical storage
-            # Verify the file was created
-            if backup_file.exists():
-                print(f"Successfully created file: {backup_file}")
-            else:
-                print(f"File creation failed. File doesn't exist: {backup_file}")
 
         except Exception as err:
-            print(f"ERROR type: {type(err).__name__}")
-            print(f"ERROR message: {str(err)}")
-            print(f"ERROR details: {repr(err)}")
-            # Print stack trace for more details
-            import traceback
-            traceback.print_exc()
+            # Logs the stack trace for more details
+            logger.exception("Error while saving backup data: %r", err)
 
     def get_saved_files(self):
         if not hasattr(self, "backup_dir"):
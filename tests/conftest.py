@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The modules import each other from src, as when the app is run with python src/app.py
+_src_dir = str(Path(__file__).parent.parent / "src")
+if _src_dir not in sys.path:
+    sys.path.insert(0, _src_dir)
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from config.config_handler import DeviceInputMappingHandler
+
+
+def test_save_numpy_calibration_value(tmp_path):
+    np = pytest.importorskip("numpy")
+    path = tmp_path / "device_input_map.json"
+    port_mapper = DeviceInputMappingHandler(config_path=str(path))
+
+    port_mapper.set_calibration_value("i1", "alkaline_value", np.float64(12345.5))
+
+    saved = json.loads(path.read_text())
+    assert saved["i1"]["alkaline_value"] == 12345.5
+    assert saved["i2"] == port_mapper.get_input_number("i2")
+
+
+def test_failed_save_is_retried(tmp_path, monkeypatch):
+    import config.config_handler as config_handler
+
+    path = tmp_path / "device_input_map.json"
+    port_mapper = DeviceInputMappingHandler(config_path=str(path))
+    dumps = config_handler._dumps
+
+    def failing_dumps(config):
+        raise OSError("disk full")
+    monkeypatch.setattr(config_handler, "_dumps", failing_dumps)
+    port_mapper.set_calibration_value("i1", "acidic_value", 1000)
+    assert json.loads(path.read_text())["i1"]["acidic_value"] == 0
+
+    monkeypatch.setattr(config_handler, "_dumps", dumps)
+    port_mapper.flush()
+    assert json.loads(path.read_text())["i1"]["acidic_value"] == 1000
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+controllers = pytest.importorskip("instruments.controllers")
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Records the (pin, level, time) of every GPIO write."""
+    start = time.monotonic()
+    recorded = []
+    monkeypatch.setattr(controllers.gpio_chip, "write",
+                        lambda pin, level: recorded.append((pin, level, time.monotonic() - start)))
+    return recorded
+
+
+def wait_for(events, count, timeout=3):
+    deadline = time.monotonic() + timeout
+    while len(events) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_pulses_on_different_pins_overlap(writes):
+    worker = controllers.GpioWorker()
+    closed = []
+    worker.pulse(9, 0.4, lambda: closed.append(9))
+    worker.pulse(11, 0.2, lambda: closed.append(11))
+
+    wait_for(closed, 2)
+    assert closed == [11, 9]
+    assert [(pin, level) for pin, level, _ in writes] == [(9, 0), (11, 0), (11, 1), (9, 1)]
+    assert writes[2][2] == pytest.approx(0.2, abs=0.1)
+    assert writes[3][2] == pytest.approx(0.4, abs=0.1)
+
+
+def test_pulse_on_open_pin_extends_it(writes):
+    worker = controllers.GpioWorker()
+    closed = []
+    worker.pulse(9, 0.4, lambda: closed.append(("first", time.monotonic())))
+    time.sleep(0.2)
+    worker.pulse(9, 0.4, lambda: closed.append(("second", time.monotonic())))
+
+    wait_for(closed, 2)
+    assert [(pin, level) for pin, level, _ in writes] == [(9, 0), (9, 1)]
+    # Open for both pulses, not closed by the first deadline
+    assert writes[1][2] - writes[0][2] == pytest.approx(0.8, abs=0.1)
+    assert [name for name, _ in closed] == ["first", "second"]
+
+
+def test_register_sensors_releases_replaced_toggle_controller():
+    class Socket:
+        connected = False
+        def on(self, *args): pass
+        def emit(self, *args): pass
+
+    location = {"id": "location", "name": "Location", "isAcidPumping": False, "isBasePumping": False, "sensors": [{
+        "devicePort": "i1", "targetPh": 7, "maxValveTimeOpen": 1, "margin": 0.1, "mode": "auto", "phMonitorFrequency": 5,
+    }]}
+    manager = controllers.SensorManager(Socket(), lambda data: None, lambda *args: None)
+
+    manager._toggle_pump({"selectedLocation": location, "pump": "acidic"})
+    manager._toggle_pump({"selectedLocation": location, "pump": "acidic"})
+    manager.register_sensors([location])
+    manager.stop_controllers()
+
+    deadline = time.monotonic() + 3
+    while controllers.gpio_chip.handle is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert controllers.gpio_chip.handle is None
+
+
+def test_write_during_pulse_ends_it(writes):
+    worker = controllers.GpioWorker()
+    closed = []
+    worker.pulse(9, 0.4, lambda: closed.append("pulse"))
+    time.sleep(0.1)
+    # Closed by hand before the pulse ends
+    worker.write(9, 1)
+    wait_for(closed, 1)
+    assert closed == ["pulse"]
+
+    worker.pulse(9, 0.6, lambda: closed.append("next pulse"))
+    wait_for(closed, 2)
+    assert [(pin, level) for pin, level, _ in writes] == [(9, 0), (9, 1), (9, 0), (9, 1)]
+    # The first pulse deadline did not close the new pulse early
+    assert writes[3][2] - writes[2][2] == pytest.approx(0.6, abs=0.1)
+
+
+def test_slow_callback_does_not_delay_other_pins(writes):
+    worker = controllers.GpioWorker()
+    closed = []
+
+    def slow_emit():
+        time.sleep(0.5)
+        closed.append(9)
+    worker.pulse(9, 0.1, slow_emit)
+    worker.pulse(11, 0.2, lambda: closed.append(11))
+
+    wait_for(closed, 2)
+    assert [(pin, level) for pin, level, _ in writes] == [(9, 0), (11, 0), (9, 1), (11, 1)]
+    assert writes[3][2] == pytest.approx(0.2, abs=0.1)
@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from utils import json_shim
+
+np = pytest.importorskip("numpy")
+
+
+def test_dumps_numpy_values():
+    data = {"y": round(np.float64(7.123), 2), "x": np.int64(3), "values": np.array([4.0, 7.0])}
+    assert json.loads(json_shim.dumps(data)) == {"y": 7.12, "x": 3, "values": [4.0, 7.0]}
+
+
+def test_dumps_falls_back_to_json():
+    class Reading(float):
+        pass
+    assert json.loads(json_shim.dumps({"y": Reading(7.5)})) == {"y": 7.5}
+
+
+def test_encode_sensor_data_packet():
+    packet = pytest.importorskip("socketio.packet")
+
+    class Packet(packet.Packet):
+        json = json_shim
+
+    encoded = Packet(packet.EVENT, data=["sensor_data", {
+        "deviceID": "device",
+        "data": [{"id": "location", "x": 1, "y": round(np.float64(6.987), 2)}],
+    }]).encode()
+    assert encoded == '2["sensor_data",{"deviceID":"device","data":[{"id":"location","x":1,"y":6.99}]}]'